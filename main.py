@@ -1,49 +1,224 @@
+import os
 import re
-from fastapi import FastAPI
+import math
+import asyncio
+import threading
+import time as clock
+import secrets
+import orjson
+from fastapi import FastAPI, Header, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, ValidationError
-import gspread
-from google.oauth2.service_account import Credentials
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+import numpy as np
+import pandas as pd
+import pgeocode
 from datetime import datetime, timedelta, time
 from geopy.geocoders import Nominatim
 from geopy.distance import geodesic
+from geopy.adapters import AioHTTPAdapter
+from geopy.extra.rate_limiter import AsyncRateLimiter
+from rapidfuzz import fuzz, process
+from sqlitedict import SqliteDict
 from geopy.exc import GeocoderTimedOut, GeocoderUnavailable
 from functools import lru_cache
+from operator import itemgetter
+from collections import defaultdict
+from bisect import bisect_right
+from typing import NamedTuple
+from contextlib import asynccontextmanager, suppress
+from sheets_client import CACHE_TTL_SECONDS, fetch_rows, last_fetched_at, load_cache_from_disk, save_cache_to_disk
 
-app = FastAPI()
+class ORJSONResponse(JSONResponse):
+    """Renders responses with orjson."""
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Runs the background refresh for the life of the app and saves the caches on shutdown."""
+    load_cache_from_disk()
+    refresh_task = asyncio.create_task(refresh_loop())
+    try:
+        async with geolocator:
+            yield
+    finally:
+        refresh_task.cancel()
+        try:
+            with suppress(asyncio.CancelledError): await refresh_task
+        finally:
+            save_cache_to_disk()
+            geocode_cache.close()
+
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
 
 # --- Configuration ---
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"],
 )
-SHEET_NAME = "Foreclosure Deals"
-WORKSHEET_NAME = "Sheet1"
-CREDENTIALS_FILE = "credentials2.json"
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+EARTH_RADIUS_MILES = 3958.8
+MILES_PER_DEGREE_LAT = 69.0
+GEODESIC_MARGIN = 0.01
+FUZZY_SCORE_CUTOFF = 85
+FUZZY_MIN_QUERY_LENGTH = 4
+FUZZY_MATCH_LIMIT = 50
+GEOCODE_CACHE_FILE = "geocode.sqlite"
+GEOCODE_MEMO_SIZE = 100_000
+POSTAL_RETRY_SECONDS = 300
+DEFAULT_STATE = "TN"
+ZIP_PATTERN = re.compile(r"\b(\d{5})(?:-\d{4})?$")
+STATE_SUFFIX_PATTERN = re.compile(r",?\s*\b(?:tn|tennessee)$")
+DISTANCE_PATTERN = re.compile(r"(at least|more than|over|greater than|at most|within|less than|under)?\s*(\d+(?:\.\d+)?)\s*(mile|min|minute|hr|hour)s?\s*(?:from|of|around|near)?\s*(.+)", re.IGNORECASE)
+FILLER_PATTERN = re.compile(r"\b(?:in|on|for|at|the|a|are|that|show|me|give|find|listings|properties|list|homes|sale)\b", re.IGNORECASE)
+NO_MATCH_PATTERN = re.compile("(?!)")
 
 # --- Services ---
-geolocator = Nominatim(user_agent="foreclosure_finder_app_v4")
+geolocator = Nominatim(user_agent="foreclosure_finder_app_v4", adapter_factory=AioHTTPAdapter)
+# Nominatim's usage policy allows one request per second.
+nominatim_geocode = AsyncRateLimiter(geolocator.geocode, min_delay_seconds=1, max_retries=0, swallow_exceptions=False)
+geocode_cache = SqliteDict(GEOCODE_CACHE_FILE, autocommit=True)
+geocode_tasks = {}
+_POSTAL = {"geocoder": None, "retry_at": float("-inf")}
+_POSTAL_LOCK = threading.Lock()
+
+# --- Sheet Data & Search Indexes ---
+_SHEET = {"rows": None, "data": None}
+_SHEET_LOCK = threading.Lock()
+
+class SheetData(NamedTuple):
+    rows: list
+    known_locations: tuple
+    location_pattern: re.Pattern
+    texts: list
+    corpus: str
+    row_offsets: list
+    location_index: dict
+    trigram_index: dict
+    coords: np.ndarray    # NaN until the row has been geocoded.
+    addresses: list
+    frame: pd.DataFrame
+    records: list
+
+EMPTY_SHEET = SheetData([], (), NO_MATCH_PATTERN, [], "", [], {}, {}, np.empty((0, 2)), [],
+                        pd.DataFrame({"SaleDate": pd.Series([], dtype="datetime64[ns]"), "SaleTime": pd.Series([], dtype=float)}), [])
 
-# --- Google Sheets Connection & Data Caching ---
-@lru_cache(maxsize=1)
-def get_sheet_data():
-    """Caches the sheet data to avoid repeated API calls to Google."""
+def parse_row_coords(row: dict):
+    """Reads the precomputed Lat/Lon columns of a row, if the sheet has them."""
     try:
-        scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-        creds = Credentials.from_service_account_file(CREDENTIALS_FILE, scopes=scope)
-        gc = gspread.authorize(creds)
-        worksheet = gc.open(SHEET_NAME).worksheet(WORKSHEET_NAME)
-        data = worksheet.get_all_records()
-        
-        # Extract unique locations for smarter searching
-        all_cities = set(row['City'].lower() for row in data if row.get('City'))
-        all_counties = set(row['County'].lower() for row in data if row.get('County'))
-        known_locations = all_cities.union(all_counties)
-
-        return data, known_locations
+        return (float(row["Lat"]), float(row["Lon"]))
+    except (KeyError, ValueError, TypeError):
+        return None
+
+def build_sheet_data(data: list):
+    """Builds the search indexes over the sheet's rows."""
+    # Fill in Property columns the sheet lacks, on copies of the cached rows.
+    missing = [field for field in PROPERTY_FIELDS if data and field not in data[0]]
+    if missing: data = [{**dict.fromkeys(missing, ""), **row} for row in data]
+
+    # Index rows by City and County for location queries
+    location_index = defaultdict(list)
+    for i, row in enumerate(data):
+        for column in ("City", "County"):
+            if row.get(column): location_index[row[column].lower()].append(i)
+    known_locations = tuple(sorted(location_index))
+    location_pattern = (re.compile("(?=(" + "|".join(map(re.escape, sorted(known_locations, key=len, reverse=True))) + "))")
+                        if known_locations else NO_MATCH_PATTERN)
+
+    texts = [" ".join(map(str, row.values())).lower() for row in data]
+    row_offsets, offset = [], 0
+    for text in texts:
+        row_offsets.append(offset)
+        offset += len(text) + 1
+
+    trigram_index = defaultdict(set)
+    for i, text in enumerate(texts):
+        for trigram in {text[k:k + 3] for k in range(len(text) - 2)}:
+            trigram_index[trigram].add(i)
+    # Coordinates from the sheet, then ZIP centroids, then city centroids; the rest are geocoded on demand.
+    coords = np.array([parse_row_coords(row) or (np.nan, np.nan) for row in data], dtype=float).reshape(-1, 2)
+    missing = np.flatnonzero(np.isnan(coords[:, 0]))
+    if len(missing): coords[missing] = lookup_postal_codes([data[i].get("ZipCode", "") for i in missing])
+    try:
+        city_centroids = get_city_centroids(DEFAULT_STATE)
     except Exception as e:
-        print(f"CRITICAL ERROR: Could not connect to Google Sheets. {e}")
-        return [], set()
+        print(f"Offline postal table unavailable: {e}")
+        city_centroids = {}
+    for i in np.flatnonzero(np.isnan(coords[:, 0])):
+        city_coords = city_centroids.get(data[i].get("City", "").lower())
+        if city_coords: coords[i] = city_coords
+    addresses = [f"{row.get('PropertyAddress', '')}, {row.get('City', '')}, {DEFAULT_STATE}" for row in data]
+
+    sale_dates = pd.Series([row.get("SaleDate", "") for row in data], dtype=object)
+    sale_times = pd.to_datetime(pd.Series([row.get("SaleTime", "") for row in data], dtype=object),
+                                format="%I:%M %p", errors="coerce", cache=True)
+    frame = pd.DataFrame({
+        "SaleDate": pd.to_datetime(sale_dates, format="%m/%d/%Y", errors="coerce", cache=True),
+        "SaleTime": sale_times.dt.hour * 60 + sale_times.dt.minute,  # Minutes after midnight.
+    })
+
+    records = [dict(zip(PROPERTY_FIELDS, get_property_fields(row))) for row in data]
+
+    return SheetData(data, known_locations, location_pattern, texts, "\x00".join(texts), row_offsets,
+                     dict(location_index), dict(trigram_index), coords, addresses, frame, records)
+
+def match_locations(sheet: SheetData, query_lower: str):
+    """Returns every known location named in the query."""
+    longest = sheet.location_pattern.findall(query_lower)
+    return {name[:k] for name in longest for k in range(1, len(name) + 1) if name[:k] in sheet.location_index}
+
+def search_corpus(sheet: SheetData, needle: str):
+    """Returns the ids of the rows whose search text contains `needle`."""
+    if "\x00" in needle: return []
+    row_ids = []
+    pos = sheet.corpus.find(needle)
+    while pos != -1:
+        row_id = bisect_right(sheet.row_offsets, pos) - 1
+        row_ids.append(row_id)
+        if row_id + 1 == len(sheet.row_offsets): break
+        pos = sheet.corpus.find(needle, sheet.row_offsets[row_id + 1])
+    return row_ids
+
+def search_all_tokens(sheet: SheetData, tokens: list):
+    """Returns the ids of the rows containing every token, narrowed down by the trigram index first."""
+    tokens = set(tokens)
+    if not tokens: return []
+    postings = [sheet.trigram_index.get(token[k:k + 3], set()) for token in tokens for k in range(len(token) - 2)]
+    row_ids = set.intersection(*postings) if postings else range(len(sheet.texts))
+    return sorted(i for i in row_ids if all(token in sheet.texts[i] for token in tokens))
+
+def fuzzy_search(sheet: SheetData, query: str):
+    """Returns the ids of the rows that approximately contain `query`."""
+    if len(query) < FUZZY_MIN_QUERY_LENGTH: return []
+    hits = process.extract(query, sheet.texts, scorer=fuzz.partial_ratio,
+                           score_cutoff=FUZZY_SCORE_CUTOFF, limit=FUZZY_MATCH_LIMIT)
+    return sorted(row_id for _, _, row_id in hits)
+
+def rows_mask(row_count: int, row_ids):
+    """Turns a list of row ids into a per-row boolean mask."""
+    mask = np.zeros(row_count, dtype=bool)
+    mask[row_ids] = True
+    return mask
+
+def get_sheet_data(ttl: float = float("inf"), wait: bool = False):
+    """Serves the indexed sheet, rebuilding it when the rows change; None if the sheet was never reachable."""
+    rows = fetch_rows(ttl, wait)
+    if rows is not None and rows is not _SHEET["rows"]:
+        with _SHEET_LOCK:
+            if rows is not _SHEET["rows"] and rows is fetch_rows():
+                data = build_sheet_data(rows) if rows else EMPTY_SHEET
+                _SHEET["data"], _SHEET["rows"] = data, rows
+    return _SHEET["data"]
+
+async def refresh_loop():
+    """Re-fetches the sheet every CACHE_TTL_SECONDS."""
+    while True:
+        try:
+            await asyncio.to_thread(get_sheet_data, 0)
+        except Exception as e:
+            print(f"Could not refresh sheet data: {e}")
+        await asyncio.sleep(CACHE_TTL_SECONDS)
 
 # --- API Data Models ---
 class QueryRequestModel(BaseModel):
@@ -58,35 +233,117 @@ class Property(BaseModel):
     ZipCode: str
     Source: str
 
+PROPERTY_FIELDS = tuple(Property.model_fields)
+get_property_fields = itemgetter(*PROPERTY_FIELDS)
+
 # --- Smart Parsing Helper Functions ---
 
-@lru_cache(maxsize=128)
-def get_coords(location_str: str):
+async def get_coords(location_str: str):
     """Geocodes a location string with caching."""
+    key = " ".join(location_str.lower().split())
+    task = geocode_tasks.get(key)
+    if task is None:
+        if len(geocode_tasks) >= GEOCODE_MEMO_SIZE: del geocode_tasks[next(iter(geocode_tasks))]
+        task = geocode_tasks[key] = asyncio.ensure_future(geocode_location(key))
     try:
-        location = geolocator.geocode(location_str.strip().lower(), timeout=5)
-        if location:
-            return (location.latitude, location.longitude)
-    except (GeocoderTimedOut, GeocoderUnavailable):
-        print(f"Geocoding service timed out for: {location_str}")
-    return None
+        return await asyncio.shield(task)
+    except Exception as e:
+        # Don't memoize failures.
+        if geocode_tasks.get(key) is task: del geocode_tasks[key]
+        if not isinstance(e, (GeocoderTimedOut, GeocoderUnavailable)): raise
+        print(f"Geocoding service timed out for: {key}")
+        return None
+
+def get_postal_geocoder():
+    """Loads the offline GeoNames US postal table, retrying a failed download every POSTAL_RETRY_SECONDS."""
+    if _POSTAL["geocoder"] is not None: return _POSTAL["geocoder"]
+    with _POSTAL_LOCK:
+        if _POSTAL["geocoder"] is None:
+            if clock.monotonic() < _POSTAL["retry_at"]: raise RuntimeError("postal table download failed recently")
+            try:
+                _POSTAL["geocoder"] = pgeocode.Nominatim("us")
+            except Exception:
+                _POSTAL["retry_at"] = clock.monotonic() + POSTAL_RETRY_SECONDS
+                raise
+        return _POSTAL["geocoder"]
 
-def parse_date_query(query: str):
+def lookup_postal_codes(zip_codes: list):
+    """Returns an (N, 2) array with the lat/lon of each ZIP's centroid, NaN where the ZIP is unknown."""
+    try:
+        found = get_postal_geocoder().query_postal_code([str(z)[:5] for z in zip_codes])
+    except Exception as e:
+        print(f"Offline postal table unavailable: {e}")
+        return np.full((len(zip_codes), 2), np.nan)
+    return found[["latitude", "longitude"]].to_numpy(dtype=float)
+
+@lru_cache(maxsize=None)
+def get_city_centroids(state: str):
+    """Lowercased place name -> centroid of its ZIP codes, for one state of the postal table."""
+    places = get_postal_geocoder()._data
+    places = places[places["state_code"] == state]
+    centroids = places.groupby(places["place_name"].str.lower())[["latitude", "longitude"]].mean()
+    return {name: (float(lat), float(lon)) for name, lat, lon in centroids.itertuples()}
+
+def lookup_city(city: str, state: str = DEFAULT_STATE):
+    """Returns the centroid of a city's ZIP codes from the offline postal table, or None if it isn't listed."""
+    try:
+        return get_city_centroids(state).get(city)
+    except Exception as e:
+        print(f"Offline postal table unavailable: {e}")
+        return None
+
+def geocode_offline(location_str: str):
+    """Resolves a string ending in a ZIP code, or a bare city name, without any network call."""
+    zip_match = ZIP_PATTERN.search(location_str)
+    if zip_match:
+        lat, lon = lookup_postal_codes([zip_match.group(1)])[0]
+        if not np.isnan(lat): return (float(lat), float(lon))
+    city = STATE_SUFFIX_PATTERN.sub("", location_str).strip(" ,")
+    if "," in city or any(c.isdigit() for c in city): return None
+    return lookup_city(city)
+
+def lookup_stored(location_str: str):
+    """Resolves a location from the offline postal table or the on-disk cache; KeyError if neither has it."""
+    return geocode_offline(location_str) or geocode_cache[location_str]
+
+async def geocode_location(location_str: str):
+    """Geocodes a normalized location string offline or from the disk cache, falling back to Nominatim."""
+    try:
+        return await asyncio.to_thread(lookup_stored, location_str)
+    except KeyError:
+        pass
+    location = await nominatim_geocode(location_str, timeout=5)
+    coords = (location.latitude, location.longitude) if location else None
+    await asyncio.to_thread(geocode_cache.__setitem__, location_str, coords)
+    return coords
+
+def week_of(day):
+    """The Monday-to-Sunday week containing `day`."""
+    start = day - timedelta(days=day.weekday())
+    return start, start + timedelta(days=6)
+
+DATE_RANGES = {
+    "today": lambda today: (today, today),
+    "tomorrow": lambda today: (today + timedelta(days=1), today + timedelta(days=1)),
+    "this week": week_of,
+    "next week": lambda today: week_of(today + timedelta(days=7)),
+}
+
+def parse_date_query(query: str, today):
     query_lower = query.lower()
-    today = datetime.now().date()
-    if "today" in query_lower: return today, today
-    if "tomorrow" in query_lower: return today + timedelta(days=1), today + timedelta(days=1)
-    if "this week" in query_lower:
-        start = today - timedelta(days=today.weekday())
-        return start, start + timedelta(days=6)
-    if "next week" in query_lower:
-        start = today + timedelta(days=(7 - today.weekday()))
-        return start, start + timedelta(days=6)
+    for phrase, date_range in DATE_RANGES.items():
+        if phrase in query_lower: return date_range(today)
     return None
 
+def haversine_miles(lats, lons, lat0: float, lon0: float):
+    """Great-circle distance in miles from (lat0, lon0) to every point."""
+    lats, lons = np.radians(lats), np.radians(lons)
+    lat0, lon0 = np.radians(lat0), np.radians(lon0)
+    a = np.sin((lats - lat0) / 2) ** 2 + np.cos(lat0) * np.cos(lats) * np.sin((lons - lon0) / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(a))
+
 def parse_distance_query(query: str):
-    pattern = re.compile(r"(at least|more than|over|greater than|at most|within|less than|under)?\s*(\d+(?:\.\d+)?)\s*(mile|min|minute|hr|hour)s?\s*(?:from|of|around|near)?\s*(.+)", re.IGNORECASE)
-    match = pattern.search(query)
+    match = DISTANCE_PATTERN.search(query)
     if not match: return None
     comp, val_str, unit, loc_str = match.groups()
     dist = float(val_str)
@@ -94,8 +351,7 @@ def parse_distance_query(query: str):
     elif 'hr' in unit: dist *= 45
     
     min_dist, max_dist = (dist, None) if comp and comp.lower() in ["at least", "more than", "over", "greater than"] else (None, dist)
-    target_coords = get_coords(loc_str)
-    return (max_dist, min_dist, target_coords) if target_coords else None
+    return max_dist, min_dist, loc_str
 
 def parse_time_of_day_query(query: str):
     query_lower = query.lower()
@@ -104,90 +360,96 @@ def parse_time_of_day_query(query: str):
     if "evening" in query_lower: return time(17, 0), time(21, 0)
     return None
 
+class ParsedQuery(NamedTuple):
+    distance: tuple
+    date_range: tuple
+    time_range: tuple
+    keywords: str
+
+@lru_cache(maxsize=1024)
+def parse_query(query_lower: str, today):
+    """Parses every filter out of a lowercased query, cached per day."""
+    return ParsedQuery(parse_distance_query(query_lower), parse_date_query(query_lower, today),
+                       parse_time_of_day_query(query_lower), " ".join(FILLER_PATTERN.sub(" ", query_lower).split()))
+
 # --- Main API Endpoint ---
-@app.post("/query_foreclosure_sheet", response_model=list[Property])
-def query_foreclosure_sheet(payload: QueryRequestModel):
-    data, known_locations = get_sheet_data()
-    if not data: return []
+@app.post("/query_foreclosure_sheet", response_model=None, responses={200: {"model": list[Property]}})
+async def query_foreclosure_sheet(payload: QueryRequestModel):
+    return await search_properties(payload.query)
+
+async def search_properties(query: str):
+    sheet = _SHEET["data"] or await asyncio.to_thread(get_sheet_data)
+    if sheet is None: raise HTTPException(status_code=503, detail="Google Sheet not accessible.")
+    if not sheet.rows: return []
 
-    query = payload.query.strip()
+    query = query.strip()
     query_lower = query.lower()
 
     # --- Step 1: Parse all possible filters from the query ---
-    distance_params = parse_distance_query(query)
-    date_range = parse_date_query(query)
-    time_range = parse_time_of_day_query(query)
-    
+    distance_params, date_range, time_range, keywords = parse_query(query_lower, datetime.now().date())
+    if distance_params:
+        max_dist, min_dist, location = distance_params
+        target_coords = await get_coords(location)
+        distance_params = (max_dist, min_dist, target_coords) if target_coords else None
+
     location_keywords = []
     if not distance_params:
-        location_keywords = [loc for loc in known_locations if loc in query_lower]
-
-    # --- Step 2: Iteratively filter the data ---
-    results = []
-    for row in data:
-        is_match = True
-
-        if date_range:
-            sale_date_str = row.get("SaleDate")
-            if not sale_date_str: is_match = False
-            else:
-                try:
-                    sale_date = datetime.strptime(sale_date_str, "%m/%d/%Y").date()
-                    if not (date_range[0] <= sale_date <= date_range[1]): is_match = False
-                except (ValueError, TypeError): is_match = False
-        if not is_match: continue
-
-        if time_range:
-            sale_time_str = row.get("SaleTime")
-            if not sale_time_str: is_match = False
-            else:
-                try:
-                    sale_time = datetime.strptime(sale_time_str, "%I:%M %p").time()
-                    if not (time_range[0] <= sale_time <= time_range[1]): is_match = False
-                except (ValueError, TypeError): is_match = False
-        if not is_match: continue
-
-        if distance_params:
-            max_dist, min_dist, target_coords = distance_params
-            address = f"{row.get('PropertyAddress', '')}, {row.get('City', '')}, TN"
-            prop_coords = get_coords(address)
-            if not prop_coords: is_match = False
-            else:
-                dist = geodesic(target_coords, prop_coords).miles
-                if max_dist is not None and dist > max_dist: is_match = False
-                if min_dist is not None and dist < min_dist: is_match = False
-        if not is_match: continue
-
-        if location_keywords:
-            row_loc_text = f"{row.get('City', '')} {row.get('County', '')}".lower()
-            if not any(loc in row_loc_text for loc in location_keywords):
-                is_match = False
-        if not is_match: continue
-        
-        if not any([distance_params, date_range, time_range, location_keywords]):
-             if query_lower not in " ".join(str(v).lower() for v in row.values()):
-                 is_match = False
-        if not is_match: continue
-
-        results.append(row)
-
-    # --- Step 3: Format and Validate the final results ---
-    validated_results = []
-    for r in results:
-        try:
-            # Explicitly cast all values to string to match the Pydantic model and prevent errors.
-            property_instance = Property(
-                PropertyAddress=str(r.get("PropertyAddress", "")),
-                SaleDate=str(r.get("SaleDate", "")),
-                SaleTime=str(r.get("SaleTime", "")),
-                City=str(r.get("City", "")),
-                County=str(r.get("County", "")),
-                ZipCode=str(r.get("ZipCode", "")),
-                Source=str(r.get("Source", ""))
-            )
-            validated_results.append(property_instance)
-        except ValidationError as e:
-            # This will log if a row has fundamentally invalid data that even casting can't fix.
-            print(f"Skipping row due to validation error: {r} -> {e}")
-
-    return validated_results
+        location_keywords = match_locations(sheet, query_lower)
+
+    # --- Step 2: Narrow down the candidate rows using the prebuilt indexes ---
+    mask = np.ones(len(sheet.rows), dtype=bool)
+    if location_keywords:
+        mask = rows_mask(len(sheet.rows), list(set().union(*(sheet.location_index[loc] for loc in location_keywords))))
+    elif not any([distance_params, date_range, time_range]):
+        mask = rows_mask(len(sheet.rows), search_corpus(sheet, query_lower)
+                         or search_all_tokens(sheet, keywords.split())
+                         or fuzzy_search(sheet, keywords))
+
+    if date_range:
+        mask &= sheet.frame["SaleDate"].between(pd.Timestamp(date_range[0]), pd.Timestamp(date_range[1])).to_numpy()
+
+    if time_range:
+        start, end = (t.hour * 60 + t.minute for t in time_range)
+        mask &= sheet.frame["SaleTime"].between(start, end).to_numpy()
+
+    # --- Step 3: Apply the distance filter to the remaining rows in one vectorized pass ---
+    if distance_params and mask.any():
+        max_dist, min_dist, target_coords = distance_params
+        lats, lons = sheet.coords[:, 0], sheet.coords[:, 1]
+        if max_dist is not None:
+            # Bounding box first; rows without coordinates stay in and get geocoded below.
+            lat0, lon0 = target_coords
+            dlat = max_dist / MILES_PER_DEGREE_LAT
+            dlon = max_dist / (MILES_PER_DEGREE_LAT * math.cos(math.radians(min(abs(lat0) + dlat, 89.9))))
+            mask &= ~((np.abs(lats - lat0) > dlat) | (np.abs(lons - lon0) > dlon))
+        missing = np.flatnonzero(mask & np.isnan(lats))
+        if len(missing):
+            lookups = (get_coords(sheet.addresses[i]) for i in missing)
+            for i, prop_coords in zip(missing, await asyncio.gather(*lookups)):
+                if prop_coords: sheet.coords[i] = prop_coords
+        ids = np.flatnonzero(mask)
+        dists = np.full(len(mask), np.nan)
+        dists[ids] = haversine_miles(lats[ids], lons[ids], *target_coords)
+        # Re-measure rows near the cutoff exactly.
+        cutoff = max_dist if max_dist is not None else min_dist
+        for i in np.flatnonzero(mask & (np.abs(dists - cutoff) <= GEODESIC_MARGIN * cutoff)):
+            dists[i] = geodesic(target_coords, tuple(sheet.coords[i])).miles
+        mask &= ~np.isnan(dists)
+        if max_dist is not None: mask &= dists <= max_dist
+        if min_dist is not None: mask &= dists >= min_dist
+
+    # --- Step 4: Format the final results ---
+    return ORJSONResponse([sheet.records[i] for i in np.flatnonzero(mask)])
+
+# --- Admin Endpoints ---
+@app.post("/invalidate_cache")
+async def invalidate_cache(x_admin_token: str = Header(default="")):
+    """Re-fetches the sheet from Google right away; requires ADMIN_TOKEN in the X-Admin-Token header."""
+    if not ADMIN_TOKEN or not secrets.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Forbidden.")
+    requested_at = clock.monotonic()
+    if await asyncio.to_thread(get_sheet_data, 0, True) is None:
+        raise HTTPException(status_code=503, detail="Google Sheet not accessible.")
+    if last_fetched_at() < requested_at:
+        raise HTTPException(status_code=503, detail="Could not refresh the sheet; serving the cached copy.")
+    return {"status": "ok"}
@@ -0,0 +1,115 @@
+import os
+import pickle
+import threading
+import time as clock
+import gspread
+from itertools import chain, repeat
+from google.oauth2.service_account import Credentials
+from functools import lru_cache
+
+# --- Configuration ---
+SHEET_NAME = "Foreclosure Deals"
+WORKSHEET_NAME = "Sheet1"
+SPREADSHEET_ID = os.environ.get("SPREADSHEET_ID")
+SHEET_RANGES = [WORKSHEET_NAME]
+CREDENTIALS_FILE = "credentials2.json"
+CACHE_TTL_SECONDS = 60
+FETCH_RETRY_SECONDS = 30
+CACHE_FILE = "sheet_cache.pkl"
+
+# --- Shared Client ---
+@lru_cache(maxsize=1)
+def get_spreadsheet():
+    """Authorizes once and keeps the spreadsheet handle for the life of the process."""
+    scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
+    creds = Credentials.from_service_account_file(CREDENTIALS_FILE, scopes=scope)
+    gc = gspread.authorize(creds)
+    return gc.open_by_key(SPREADSHEET_ID) if SPREADSHEET_ID else gc.open(SHEET_NAME)
+
+def records_from_values(values: list):
+    """Turns a raw block of cell values into one dict of stripped strings per row, keyed by the header row."""
+    if not values: return []
+    headers = [str(h).strip() for h in values[0]]
+    # The API trims trailing empty cells, so pad short rows back out to the header width.
+    padding = repeat("")
+    return [{h: str(v).strip() for h, v in zip(headers, chain(row, padding))}
+            for row in values[1:] if row]
+
+def fetch_all(spreadsheet, ranges: list = SHEET_RANGES):
+    """Reads every range in one values.batchGet request and returns {range: records}."""
+    response = spreadsheet.values_batch_get(ranges)
+    # valueRanges come back in request order; empty ranges have no "values" key.
+    return {r: records_from_values(vr.get("values", [])) for r, vr in zip(ranges, response.get("valueRanges", []))}
+
+# --- TTL Cache ---
+class CachedSheet:
+    """The worksheet's rows and when they were last fetched; only one caller fetches at a time."""
+
+    def __init__(self):
+        self.rows = None
+        self.fetched_at = float("-inf")
+        self.failed_at = float("-inf")
+        self.attempts = 0
+        self.refresh_lock = threading.Lock()
+
+    def get(self, ttl: float = float("inf"), wait: bool = False):
+        """Returns the rows, re-fetching them once they are older than `ttl` seconds; None if never fetched."""
+        if self.rows is not None and clock.monotonic() - self.fetched_at <= ttl: return self.rows
+        if self.backing_off(): return None
+        attempts = self.attempts
+        if not self.refresh_lock.acquire(blocking=wait or self.rows is None): return self.rows
+        try:
+            if self.attempts == attempts and not self.backing_off():
+                self.attempts += 1
+                rows = fetch_all(get_spreadsheet()).get(WORKSHEET_NAME, [])
+                if rows != self.rows: self.rows = rows
+                self.fetched_at = clock.monotonic()
+        except Exception as e:
+            # Keep serving the last good copy (if any) when Google is unreachable.
+            self.failed_at = clock.monotonic()
+            print(f"CRITICAL ERROR: Could not connect to Google Sheets. {e}")
+        finally:
+            self.refresh_lock.release()
+        return self.rows
+
+    def backing_off(self):
+        """True while the sheet has never loaded and the last attempt failed recently."""
+        return self.rows is None and clock.monotonic() - self.failed_at < FETCH_RETRY_SECONDS
+
+    def load(self, path: str):
+        """Restores rows saved by `save`."""
+        if not os.path.exists(path): return
+        try:
+            with open(path, "rb") as f:
+                snapshot = pickle.load(f)
+            if isinstance(snapshot.get("rows"), list) and self.rows is None: self.rows = snapshot["rows"]
+        except Exception as e:
+            print(f"Could not restore sheet cache from {path}: {e}")
+
+    def save(self, path: str):
+        """Persists the rows so they survive restarts."""
+        rows = self.rows
+        if rows is None: return
+        try:
+            with open(path, "wb") as f:
+                pickle.dump({"rows": rows}, f)
+        except Exception as e:
+            print(f"Could not persist sheet cache to {path}: {e}")
+
+_sheet_cache = CachedSheet()
+
+def fetch_rows(ttl: float = float("inf"), wait: bool = False):
+    """Returns the worksheet's rows from the shared cache; see `CachedSheet.get`."""
+    return _sheet_cache.get(ttl, wait)
+
+def load_cache_from_disk():
+    """Restores the shared cache from CACHE_FILE."""
+    _sheet_cache.load(CACHE_FILE)
+
+def save_cache_to_disk():
+    """Snapshots the shared cache to CACHE_FILE."""
+    _sheet_cache.save(CACHE_FILE)
+
+def last_fetched_at():
+    """When the shared cache last fetched successfully, on the clock.monotonic() scale."""
+    return _sheet_cache.fetched_at